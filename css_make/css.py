@@ -1,5 +1,4 @@
 import traceback
-from functools import cached_property
 from typing import List, Union
 
 import ldpc
@@ -10,23 +9,27 @@ from ldpc.alist import save_alist
 from ldpc.code_util import compute_code_distance
 
 from . import utils
+from .utils import cached_property
 
 
 class CssCode:
+    # ordered cheapest first: the commute checks only need hx/hz, while the
+    # later tests trigger the lx/lz computation and a rank, so an early
+    # failure in test(show=False) skips the expensive work
     _tests_list = [
+        ("PCMs commute hz@hx.T==0[hz, hx]",
+         lambda self: self._pcms_commute),
+        ("PCMs commute hx@hz.T==0[hx, hz]",
+         lambda self: self._pcms_commute),
         ("Block dimensions[N, K, lz, lx]",
          lambda self: self.N == self.lz.shape[1] == self.lx.shape[1] and self.K == self.lz.shape[0] == self.lx.shape[
              0]),
-        ("PCMs commute hz@hx.T==0[hz, hx]",
-         lambda self: not (self.hz @ self.hx.T % 2).any()),
-        ("PCMs commute hx@hz.T==0[hx, hz]",
-         lambda self: not (self.hx @ self.hz.T % 2).any()),
         ("-lx \in ker{hz} AND lz \in ker{hx}[hz, lx]",
-         lambda self: not (self.hz @ self.lx.T % 2).any()),
+         lambda self: self._gf2_commutes(self.hz, self.lx)),
         ("-lx \in ker{hz} AND lz \in ker{hx}[hx, lz]",
-         lambda self: not (self.hx @ self.lz.T % 2).any()),
+         lambda self: self._gf2_commutes(self.hx, self.lz)),
         ("-lx and lz anticommute[lx, lz]",
-         lambda self: mod2.rank(self.lx @ self.lz.T % 2) == self.K)
+         lambda self: mod2.rank(utils.gf2_matmul(self.lx, self.lz)) == self.K)
     ]
 
     @staticmethod
@@ -42,25 +45,48 @@ class CssCode:
                 number_of_words_to_save=0)[0]
 
     @staticmethod
-    def _compute_lz(hx, hz):
-        # lz logical operators
-        # lz\in ker{hx} AND \notin Im(Hz.T)
-
-        ker_hx = mod2.nullspace(hx).toarray()  # compute the kernel basis of hx
-        im_hzT = mod2.row_basis(hz).toarray()  # compute the image basis of hz.T # noqa
-
-        # in the below we row reduce to find vectors in kx that are not in the image of hz.T.
-        log_stack = np.vstack([im_hzT, ker_hx])
-        # from scipy.sparse import csr_matrix
-        # log_stack_T = csr_matrix(log_stack.T).asformat("csr")
-        # assert isinstance(log_stack_T, scipy.sparse.csr.csr_matrix)
+    def _compute_logical_ops(ker_basis, im_basis):
+        # logical operators: in the kernel basis AND not in the image basis
+
+        # in the below we row reduce to find kernel vectors that are not in the image.
+        log_stack = scipy.sparse.vstack([im_basis, ker_basis], format="csr")
         log_stack_T = log_stack.T
-        pivots = mod2.row_echelon(log_stack_T)[3]
-        log_op_indices = [i for i in range(im_hzT.shape[0], log_stack.shape[0]) if i in pivots]
+        pivots = np.asarray(utils.row_echelon(log_stack_T, return_transform=False)[3], dtype=np.intp)
+        # the pivots are ascending, so filtering them beats scanning every row
+        # index for membership (which was quadratic in the number of pivots)
+        log_op_indices = pivots[pivots >= im_basis.shape[0]]
         log_ops = log_stack[log_op_indices]
 
         return log_ops
 
+    def _compute_lx_lz(self):
+        """
+        Compute lx and lz in a single pass.
+
+        The cached hx.T/hz.T echelon factorizations provide both the kernel
+        bases (the transform rows below the rank) and the row bases (the pivot
+        rows), so nothing is row-reduced twice. Both results are cached, so
+        the first access to either logical computes the pair.
+        """
+        _, hx_rank, hx_transform, hx_pivots = self._hxT_echelon
+        _, hz_rank, hz_transform, hz_pivots = self._hzT_echelon
+
+        # the transforms are still bit-packed; only the kernel rows (below the
+        # rank) are unpacked, never the full N x N transform
+        ker_hx = scipy.sparse.csr_matrix(
+            utils.unpack_rows(hx_transform[hx_rank:], self.N, dtype=np.int8))  # kernel basis of hx
+        ker_hz = scipy.sparse.csr_matrix(
+            utils.unpack_rows(hz_transform[hz_rank:], self.N, dtype=np.int8))  # kernel basis of hz
+        im_hxT = self.hx[hx_pivots]  # image basis of hx.T # noqa
+        im_hzT = self.hz[hz_pivots]  # image basis of hz.T # noqa
+
+        lx = self._compute_logical_ops(ker_hz, im_hxT)
+        lz = self._compute_logical_ops(ker_hx, im_hzT)
+
+        self.__dict__.setdefault("lx", lx)
+        self.__dict__.setdefault("lz", lz)
+        return lx, lz
+
     def __init__(self,
                  hx=None,
                  hz=None,
@@ -69,8 +95,8 @@ class CssCode:
                  **kwargs):
 
         self.compute_distance_timeout = compute_distance_timeout
-        self.hx = utils.to_ndarray_copy(hx) if hx is not None else np.array([[]])  # hx pcm
-        self.hz = utils.to_ndarray_copy(hz) if hz is not None else np.copy(self.hx)  # hz pcm
+        self.hx = utils.to_csr(hx) if hx is not None else utils.to_csr(np.array([[]]))  # hx pcm
+        self.hz = utils.to_csr(hz) if hz is not None else self.hx.copy()  # hz pcm
         self.name = name
 
         if self.N == 0:
@@ -99,63 +125,109 @@ class CssCode:
             raise Exception("Error: hx and hz matrices must have equal numbers of columns!")
         return self.hx.shape[1]
 
+    @cached_property
+    def _hxT_echelon(self):  # noqa
+        """Echelon factorization of hx.T (transform kept packed) - consumed by the logicals computation"""
+        return utils.row_echelon(self.hx.T, packed_transform=True)
+
+    @cached_property
+    def _hzT_echelon(self):  # noqa
+        """Echelon factorization of hz.T (transform kept packed) - consumed by the logicals computation"""
+        return utils.row_echelon(self.hz.T, packed_transform=True)
+
     @cached_property
     def K(self):  # noqa
         """Code Dimension"""
-        return self.N - mod2.rank(self.hx) - mod2.rank(self.hz)
+        # transform-free rank queries: O(m*n) packed work for a wide m x n PCM,
+        # without the n x n transform the logicals factorization maintains
+        return (self.N - utils.row_echelon(self.hx, return_transform=False)[1]
+                - utils.row_echelon(self.hz, return_transform=False)[1])
+
+    @staticmethod
+    def _gf2_commutes(a, b):
+        """True when a @ b.T == 0 over GF(2); exits at the first anti-commuting row pair"""
+        return not utils.gf2_anti_commutes(a, b)
+
+    @cached_property
+    def _pcms_commute(self):
+        """whether hz @ hx.T == 0 over GF(2); hx @ hz.T is its transpose, so one check serves both tests"""
+        return self._gf2_commutes(self.hz, self.hx)
+
+    @cached_property
+    def _hx_csc(self):
+        """CSC form of hx, for column-oriented access"""
+        return self.hx.tocsc()
+
+    @cached_property
+    def _hz_csc(self):
+        """CSC form of hz, for column-oriented access"""
+        return self.hz.tocsc()
 
     @cached_property
     def L(self):  # noqa
         """LDPC params - max column weight"""
-        hx_l = np.max(np.sum(self.hx, axis=0))
-        hz_l = np.max(np.sum(self.hz, axis=0))
-        return np.max([hx_l, hz_l]).astype(int)
+        # column weights are the CSC indptr differences - no zero entry is touched
+        return int(max(np.diff(self._hx_csc.indptr).max(initial=0),
+                       np.diff(self._hz_csc.indptr).max(initial=0)))
 
     @cached_property
     def Q(self):  # noqa
         """LDPC params - max row weight"""
-        hx_q = np.max(np.sum(self.hx, axis=1))
-        hz_q = np.max(np.sum(self.hz, axis=1))
-        return np.max([hx_q, hz_q]).astype(int)
+        # row weights are the CSR indptr differences - no zero entry is touched
+        return int(max(np.diff(self.hx.indptr).max(initial=0),
+                       np.diff(self.hz.indptr).max(initial=0)))
 
     @cached_property
     def h(self):
-        hx = np.vstack([self.hx, np.zeros(self.hx.shape, dtype=np.uint8)])
-        hz = np.vstack([np.zeros(self.hz.shape, dtype=np.uint8), self.hz])
-        return np.hstack([hx, hz])
+        # None blocks stay unallocated - no PCM-sized zero buffers are built
+        return scipy.sparse.bmat([[self.hx, None], [None, self.hz]], format="csr")
 
     @cached_property
     def lx(self):
         """x logicals"""
-        return self._compute_lz(self.hz, self.hx)
+        return self._compute_lx_lz()[0]
 
     @cached_property
     def lz(self):
         """z logicals"""
-        return self._compute_lz(self.hx, self.hz)
+        return self._compute_lx_lz()[1]
 
     @cached_property
     def l(self):
-        lx = np.vstack([np.zeros(self.lz.shape, dtype=np.uint8), self.lx])
-        lz = np.vstack([self.lz, np.zeros(self.lx.shape, dtype=np.uint8)])
-        return np.hstack([lx, lz])
+        # None blocks stay unallocated - no logical-sized zero buffers are built
+        return scipy.sparse.bmat([[None, self.lz], [self.lx, None]], format="csr")
 
     @cached_property
     def canonical_lx(self):
         """Return the canonical logicals for the X stabilizers"""
-        temp = mod2.inverse(self.lx @ self.lz.T % 2)
-        return temp @ self.lx % 2
+        temp = mod2.inverse(utils.gf2_matmul(self.lx, self.lz))
+        return temp @ self.lx.toarray() % 2
 
     @cached_property
     def canonical_lz(self):
         """Return the canonical logicals for the Z stabilizers"""
         return self.lz
 
+    #: distance computation is exponential in the worst case, so D stays
+    #: unknown unless opted in via set(compute_D=True) or compute_code_distance()
+    compute_D = False
+
     @cached_property
     def D(self):  # noqa
-        dx = self._compute_code_distance(self.hx)
-        dz = self._compute_code_distance(self.hz)
-        return np.min([dx, dz])
+        if not self.compute_D:
+            return None
+        return self.compute_code_distance()
+
+    def compute_code_distance(self) -> int:
+        """
+        Explicitly compute (or estimate, for long codes) the code distance.
+        The result is cached as D.
+        """
+        dx = self._compute_code_distance(self.hx, self.compute_distance_timeout)
+        dz = self._compute_code_distance(self.hz, self.compute_distance_timeout)
+        distance = int(np.min([dx, dz]))
+        self.__dict__["D"] = distance
+        return distance
 
     @cached_property
     def valid(self):
@@ -163,7 +235,8 @@ class CssCode:
 
     @cached_property
     def code_params(self):
-        return f"({self.L},{self.Q})-[[{self.N},{self.K},{self.D}]]"
+        distance = self.D if self.D is not None else "?"
+        return f"({self.L},{self.Q})-[[{self.N},{self.K},{distance}]]"
 
     def save(self, save_property: List[str], code_name: str | None = None):
         """
@@ -174,15 +247,31 @@ class CssCode:
         if code_name is None:
             code_name = self.name
         for prop in save_property:
-            if not hasattr(self, prop) or not isinstance(getattr(self, prop), np.ndarray):
+            value = getattr(self, prop, None)
+            if scipy.sparse.issparse(value):
+                value = value.toarray()  # save_alist only handles dense arrays
+            if not isinstance(value, np.ndarray):
                 print(f"Property '{prop}' is not a valid numpy array. Skipping ..")
-            save_alist(f"{code_name}_{prop}.alist", getattr(self, prop))
+                continue
+            save_alist(f"{code_name}_{prop}.alist", value)
 
     def test(self, show: bool = True) -> bool:
+        if not show:
+            # fast path: no log to build, so stop at the first failing test
+            for name, condition in self._tests_list:
+                try:
+                    if not condition(self):
+                        return False
+                except Exception as e:
+                    print(f"Error while testing '{name}': {e}")
+                    traceback.print_exc()
+                    print(f"Failed test: {name}, the property used in the test might be incorrect")
+                    return False
+            return True
+
         results = {}
 
-        if show:
-            print(f"Testing {str(self)} ..")
+        print(f"Testing {str(self)} ..")
         for name, condition in self._tests_list:
             try:
                 results[name] = condition(self)
@@ -193,8 +282,6 @@ class CssCode:
                 results[name] = None
 
         valid = all(results.values())
-        if not show:
-            return valid
 
         print("Test logs:")
         for name, condition in results.items():
@@ -220,32 +307,45 @@ class HGP(CssCode):
                  h2=None,
                  name: str = "<Unnamed HGP>",
                  **kwargs):
-        self.h1 = utils.to_ndarray_copy(h1) if h1 is not None else np.array([[]])
-        self.h2 = utils.to_ndarray_copy(h2) if h2 is not None else np.copy(self.h1)
+        # h1/h2 are only read (shapes, kron factors, distance), so skip the copy
+        self.h1 = utils.to_ndarray(h1, copy=False) if h1 is not None else np.array([[]])
+        self.h2 = utils.to_ndarray(h2, copy=False) if h2 is not None else self.h1
 
         m1, n1 = np.shape(self.h1)
         m2, n2 = np.shape(self.h2)
 
-        i_m1, i_n1 = np.eye(m1, dtype=int), np.eye(n1, dtype=int)
-        i_m2, i_n2 = np.eye(m2, dtype=int), np.eye(n2, dtype=int)
-
-        # construct hx and hz
-        hx = np.hstack([
-            np.kron(self.h1, i_n2),  # hx1
-            np.kron(i_m1, self.h2.T)  # hx2
-        ])
-
-        hz = np.hstack([
-            np.kron(i_n1, self.h2),  # hz1
-            np.kron(self.h1.T, i_m2)  # hz2
-        ])
+        # construct hx and hz as sparse matrices: the Kronecker products are
+        # mostly zero, so dense np.kron would cost O(N^2) memory for O(nnz) data.
+        # Each distinct CSR factor is built once and shared between the four
+        # products (with the default h2 = h1 all the factors coincide)
+        h1s = scipy.sparse.csr_matrix(self.h1, dtype=np.int8)
+        h2s = h1s if h2 is None else scipy.sparse.csr_matrix(self.h2, dtype=np.int8)
+        identity = {}
+        for size in (m1, n1, m2, n2):
+            if size not in identity:
+                identity[size] = scipy.sparse.eye(size, dtype=np.int8, format="csr")
+
+        hx = scipy.sparse.hstack([
+            scipy.sparse.kron(h1s, identity[n2]),  # hx1
+            scipy.sparse.kron(identity[m1], h2s.T)  # hx2
+        ], format="csr")
+
+        hz = scipy.sparse.hstack([
+            scipy.sparse.kron(identity[n1], h2s),  # hz1
+            scipy.sparse.kron(h1s.T, identity[m2])  # hz2
+        ], format="csr")
 
         super().__init__(hx=hx, hz=hz, name=name, **kwargs)
 
-    @cached_property
-    def D(self):
-        d1 = self._compute_code_distance(self.h1)
-        d1t = self._compute_code_distance(self.h1.T)
-        d2 = self._compute_code_distance(self.h2)
-        d2t = self._compute_code_distance(self.h2.T)
-        return np.min([d1, d1t, d2, d2t]).astype(int)
+    def compute_code_distance(self) -> int:
+        """
+        Explicitly compute (or estimate, for long codes) the code distance
+        from the classical seed codes. The result is cached as D.
+        """
+        d1 = self._compute_code_distance(self.h1, self.compute_distance_timeout)
+        d1t = self._compute_code_distance(self.h1.T, self.compute_distance_timeout)
+        d2 = self._compute_code_distance(self.h2, self.compute_distance_timeout)
+        d2t = self._compute_code_distance(self.h2.T, self.compute_distance_timeout)
+        distance = int(np.min([d1, d1t, d2, d2t]))
+        self.__dict__["D"] = distance
+        return distance
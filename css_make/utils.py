@@ -1,28 +1,358 @@
 import numpy as np
-from scipy.sparse import issparse
+from scipy.sparse import csr_matrix, issparse
 
 
-def to_ndarray_copy(matrix):
+class cached_property:  # noqa
+    """
+    Lightweight replacement for functools.cached_property.
+
+    Skips the locking done by the stdlib version: the computed value is simply
+    stored in the instance __dict__ on first access, which is all this
+    single-threaded numeric code needs.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.attrname = None
+        self.__doc__ = func.__doc__
+
+    def __set_name__(self, owner, name):
+        self.attrname = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = self.func(instance)
+        instance.__dict__[self.attrname] = value
+        return value
+
+
+def to_ndarray(matrix, copy=True):
     """
     Check if the input is a dense numpy array or a sparse matrix and convert it to a dense numpy array.
 
     Args:
         matrix: The input to be checked or converted.
+        copy: If False, a dense input is returned as-is instead of copied.
+            Only safe for callers that never mutate the result (sparse input
+            always yields a fresh array via toarray()).
 
     Returns:
-        np.ndarray: A dense numpy array (copy).
+        np.ndarray: A dense numpy array.
 
     Raises:
         TypeError: If the input is not a dense numpy array or a sparse matrix, and cannot be converted.
     """
     if isinstance(matrix, np.ndarray):
-        return np.copy(matrix)
+        return np.copy(matrix) if copy else matrix
 
     if issparse(matrix):
         return matrix.toarray()
 
     try:
         print("Trying to convert the input to a dense numpy array")
-        return np.array(matrix, copy=True)
+        return np.array(matrix, copy=True) if copy else np.asarray(matrix)
     except Exception as e:
         raise TypeError("Input is not a dense numpy array and cannot be converted.") from e
+
+
+def to_ndarray_copy(matrix):
+    """Alias for to_ndarray(matrix, copy=True), kept for backward compatibility."""
+    return to_ndarray(matrix)
+
+
+def to_csr(matrix):
+    """
+    Check if the input is a dense numpy array or a sparse matrix and convert it to a CSR sparse matrix.
+
+    Args:
+        matrix: The input to be checked or converted.
+
+    Returns:
+        scipy.sparse.csr_matrix: A CSR sparse matrix (copy).
+
+    Raises:
+        TypeError: If the input is not a dense numpy array or a sparse matrix, and cannot be converted.
+    """
+    if issparse(matrix):
+        converted = csr_matrix(matrix, copy=True)
+        # canonicalize: scipy.sparse.kron (and user input) may carry explicitly
+        # stored zeros, which would inflate the indptr-based weight computations
+        converted.eliminate_zeros()
+    elif isinstance(matrix, np.ndarray):
+        converted = csr_matrix(matrix)
+    else:
+        try:
+            print("Trying to convert the input to a CSR sparse matrix")
+            converted = csr_matrix(np.array(matrix, copy=True))
+        except Exception as e:
+            raise TypeError("Input is not a dense numpy array or a sparse matrix and cannot be converted.") from e
+
+    # binary matrices are stored as int8 - 1 byte per entry instead of 8
+    if converted.nnz == 0 or converted.data.max() <= 1:
+        converted = converted.astype(np.int8)
+
+    return converted
+
+
+def _pack_rows(matrix):
+    """
+    Pack the rows of a binary matrix into little-endian np.uint64 bit-vectors.
+
+    Args:
+        matrix: A dense binary matrix (np.ndarray).
+
+    Returns:
+        np.ndarray: A (num_rows, ceil(num_cols / 64)) array of np.uint64 words.
+    """
+    packed_bytes = np.packbits(matrix.astype(np.uint8, copy=False), axis=1, bitorder="little")
+    pad = (-packed_bytes.shape[1]) % 8
+    if pad:
+        packed_bytes = np.pad(packed_bytes, ((0, 0), (0, pad)))
+    return np.ascontiguousarray(packed_bytes).view(np.uint64)
+
+
+def _pack_rows_sparse(matrix):
+    """
+    Pack the rows of a sparse binary matrix into little-endian np.uint64 bit-vectors.
+
+    Works from the coordinate structure directly, so the O(num_rows * num_cols)
+    dense form is never materialized - only O(nnz) entries are touched.
+
+    Args:
+        matrix: A sparse binary matrix (any scipy.sparse format).
+
+    Returns:
+        np.ndarray: A (num_rows, ceil(num_cols / 64)) array of np.uint64 words.
+    """
+    num_rows, num_cols = matrix.shape
+    packed = np.zeros((num_rows, (num_cols + 63) // 64), dtype=np.uint64)
+
+    coo = matrix.tocoo()
+    odd = (coo.data & 1).astype(bool)  # ignore explicitly stored zeros / even entries
+    rows = coo.row[odd]
+    cols = coo.col[odd].astype(np.int64)
+    np.bitwise_or.at(packed, (rows, cols >> 6), np.uint64(1) << (cols & 63).astype(np.uint64))
+
+    return packed
+
+
+def unpack_rows(packed, num_cols, dtype=int):
+    """
+    Inverse of `_pack_rows`: recover the dense binary matrix from uint64 bit-vectors.
+
+    Args:
+        packed: A (num_rows, num_words) array of np.uint64 words.
+        num_cols: The number of columns of the original matrix.
+        dtype: The dtype of the returned matrix.
+
+    Returns:
+        np.ndarray: The dense binary matrix.
+    """
+    return np.unpackbits(packed.view(np.uint8), axis=1, bitorder="little",
+                         count=num_cols).astype(dtype, copy=False)
+
+
+def gf2_matmul(a, b):
+    """
+    Compute a @ b.T over GF(2) via bit-packed rows.
+
+    Each output entry is the parity of popcount(row_of_a AND row_of_b), so a
+    single uint64 AND + popcount covers 64 terms of the dot product instead
+    of 64 integer multiply-adds.
+
+    Args:
+        a: A binary matrix (dense numpy array or sparse matrix).
+        b: A binary matrix with the same number of columns as `a`.
+
+    Returns:
+        np.ndarray: The (a.shape[0], b.shape[0]) matrix a @ b.T % 2 (np.uint8).
+    """
+    a = to_ndarray(a, copy=False)
+    b = to_ndarray(b, copy=False)
+
+    a_packed = _pack_rows(a)
+    b_packed = _pack_rows(b)
+
+    counts = np.bitwise_count(a_packed[:, None, :] & b_packed[None, :, :])
+    return (counts.sum(axis=2, dtype=np.uint64) & 1).astype(np.uint8)
+
+
+def gf2_anti_commutes(a, b):
+    """
+    Check whether a @ b.T over GF(2) has any non-zero entry.
+
+    Works row by row on the bit-packed operands and returns at the first row
+    of `a` with an odd overlap against some row of `b`, so the full product
+    is never materialized.
+
+    Args:
+        a: A binary matrix (dense numpy array or sparse matrix).
+        b: A binary matrix with the same number of columns as `a`.
+
+    Returns:
+        bool: True if some entry of a @ b.T % 2 is 1.
+    """
+    a_packed = _pack_rows_sparse(a) if issparse(a) else _pack_rows(to_ndarray(a, copy=False))
+    b_packed = _pack_rows_sparse(b) if issparse(b) else _pack_rows(to_ndarray(b, copy=False))
+
+    for row in a_packed:
+        if (np.bitwise_count(b_packed & row).sum(axis=1) & 1).any():
+            return True
+    return False
+
+
+def _row_echelon_packed_numpy(packed, transform, num_cols, full, with_transform):
+    """
+    Eliminate the packed rows in place with vectorized NumPy XORs.
+
+    Fallback kernel used when numba is not installed.
+
+    Returns:
+        tuple: (rank (int), pivot_cols (np.ndarray)).
+    """
+    num_rows = packed.shape[0]
+    one = np.uint64(1)
+    pivot_row = 0
+    pivot_cols = []
+
+    for col in range(num_cols):
+        if pivot_row >= num_rows:
+            break
+        word, bit = divmod(col, 64)
+        bit = np.uint64(bit)
+
+        # Select the pivot - if not in this row, swap rows to bring a 1 to this row, if possible
+        if not (packed[pivot_row, word] >> bit) & one:
+            col_bits = (packed[pivot_row:, word] >> bit) & one
+            swap_row_index = pivot_row + int(np.argmax(col_bits))
+            if (packed[swap_row_index, word] >> bit) & one:
+                packed[[swap_row_index, pivot_row]] = packed[[pivot_row, swap_row_index]]
+                if with_transform:
+                    transform[[swap_row_index, pivot_row]] = transform[[pivot_row, swap_row_index]]
+
+        # If we have got a pivot, zero the other rows with a 1 in this column
+        # in a single vectorized XOR instead of a Python loop over rows
+        if (packed[pivot_row, word] >> bit) & one:
+            mask = ((packed[:, word] >> bit) & one).astype(bool)
+            if not full:
+                mask[:pivot_row] = False
+            mask[pivot_row] = False
+            packed[mask] ^= packed[pivot_row]
+            if with_transform:
+                transform[mask] ^= transform[pivot_row]
+            pivot_row += 1
+            pivot_cols.append(col)
+
+    return pivot_row, np.asarray(pivot_cols, dtype=np.intp)
+
+
+def _row_echelon_packed_loops(packed, transform, num_cols, full, with_transform):  # pragma: no cover
+    """
+    Eliminate the packed rows in place with explicit loops.
+
+    Compiled with numba when available; the loop form lets the JIT fuse the
+    pivot search, swap and XOR without the temporaries the NumPy kernel needs.
+
+    Returns:
+        tuple: (rank (int), pivot_cols (np.ndarray)).
+    """
+    num_rows, num_words = packed.shape
+    one = np.uint64(1)
+    pivot_row = 0
+    pivot_cols = np.empty(min(num_rows, num_cols), dtype=np.intp)
+    num_pivots = 0
+
+    for col in range(num_cols):
+        if pivot_row >= num_rows:
+            break
+        word = col >> 6
+        bit = np.uint64(col & 63)
+
+        # Select the pivot - if not in this row, swap rows to bring a 1 to this row, if possible
+        if (packed[pivot_row, word] >> bit) & one == 0:
+            for swap_row_index in range(pivot_row + 1, num_rows):
+                if (packed[swap_row_index, word] >> bit) & one:
+                    for w in range(num_words):
+                        packed[pivot_row, w], packed[swap_row_index, w] = \
+                            packed[swap_row_index, w], packed[pivot_row, w]
+                    if with_transform:
+                        for w in range(transform.shape[1]):
+                            transform[pivot_row, w], transform[swap_row_index, w] = \
+                                transform[swap_row_index, w], transform[pivot_row, w]
+                    break
+
+        # If we have got a pivot, zero the other rows with a 1 in this column
+        if (packed[pivot_row, word] >> bit) & one:
+            start = 0 if full else pivot_row + 1
+            for j in range(start, num_rows):
+                if j != pivot_row and (packed[j, word] >> bit) & one:
+                    for w in range(num_words):
+                        packed[j, w] ^= packed[pivot_row, w]
+                    if with_transform:
+                        for w in range(transform.shape[1]):
+                            transform[j, w] ^= transform[pivot_row, w]
+            pivot_cols[num_pivots] = col
+            num_pivots += 1
+            pivot_row += 1
+
+    return pivot_row, pivot_cols[:num_pivots]
+
+
+try:
+    from numba import njit
+
+    _row_echelon_packed = njit(cache=True)(_row_echelon_packed_loops)
+except ImportError:
+    _row_echelon_packed = _row_echelon_packed_numpy
+
+
+def row_echelon(matrix, full=False, return_transform=True, packed_transform=False):
+    """
+    Convert a binary matrix to row echelon form via Gaussian elimination over GF(2).
+
+    The rows are bit-packed into np.uint64 words, so a single XOR between two
+    packed rows performs 64 GF(2) additions at once.
+
+    Args:
+        matrix: The binary matrix (dense numpy array or sparse matrix).
+        full: If True, rows above the pivots are eliminated as well,
+            otherwise only the rows below.
+        return_transform: If False, the transformation matrix is neither
+            maintained nor returned (its slot is None), which skips half of
+            the XOR work when only the echelon form, rank or pivots matter.
+        packed_transform: If True, the transformation matrix is returned still
+            bit-packed as (num_rows, ceil(num_rows / 64)) np.uint64 words, so
+            callers can slice the rows they need before paying for the dense
+            num_rows x num_rows form (see unpack_rows).
+
+    Returns:
+        list: [row_echelon_form (np.ndarray), rank (int),
+               transform_matrix (np.ndarray or None), pivot_cols (list)],
+        such that transform_matrix @ matrix % 2 == row_echelon_form.
+    """
+    num_rows, num_cols = matrix.shape
+
+    # packing builds a fresh buffer, so the input is never mutated and no
+    # up-front defensive copy is needed; sparse input is packed straight from
+    # its coordinate structure without densification
+    if issparse(matrix):
+        packed = _pack_rows_sparse(matrix)
+    else:
+        packed = _pack_rows(np.asarray(matrix))
+    if return_transform:
+        transform = _pack_rows(np.identity(num_rows, dtype=np.uint8))
+    else:
+        transform = np.empty((0, 0), dtype=np.uint64)
+
+    rank, pivot_cols = _row_echelon_packed(packed, transform, num_cols, full, return_transform)
+
+    row_ech_form = unpack_rows(packed, num_cols)
+    if not return_transform:
+        transform_matrix = None
+    elif packed_transform:
+        transform_matrix = transform
+    else:
+        transform_matrix = unpack_rows(transform, num_rows)
+
+    return [row_ech_form, rank, transform_matrix, [int(col) for col in pivot_cols]]